@@ -1,16 +1,35 @@
+import dataclasses
+import functools
+import hashlib
+import json
+import os
 import re
 import subprocess
+import sys
+import tempfile
 from enum import Enum
 from typing import Optional
 
-import toml
 import utilities
-from pydantic import BaseModel
-from typer import Exit, Option, Typer, secho
 from utilities import __version__ as py_version
 
-version_regex = r"^(0|[1-9]\d*)\.(0|[1-9]\d*)\.(0|[1-9]\d*)(?:-((?:0|[1-9]\d*|\d*[a-zA-Z-][0-9a-zA-Z-]*)(?:\.(?:0|[1-9]\d*|\d*[a-zA-Z-][0-9a-zA-Z-]*))*))?(?:[\+\-]([0-9a-zA-Z-]+(?:\.[0-9a-zA-Z-]+)*))?$"
-app = Typer()
+# Numeric identifiers may not have leading zeros, the alternation order decides
+# how git describe suffixes (e.g. 1-gabc123) split into prerelease and metadata
+_NUMERIC = r"0|[1-9]\d*"
+_PRERELEASE_ID = rf"(?:{_NUMERIC}|\d*[a-zA-Z-][0-9a-zA-Z-]*)"
+_METADATA_ID = r"[0-9a-zA-Z-]+"
+_VERSION_RE = re.compile(
+    rf"({_NUMERIC})\.({_NUMERIC})\.({_NUMERIC})"
+    rf"(?:-({_PRERELEASE_ID}(?:\.{_PRERELEASE_ID})*))?"
+    rf"(?:[\+\-]({_METADATA_ID}(?:\.{_METADATA_ID})*))?"
+)
+_POETRY_VERSION_RE = re.compile(
+    r"(^\[tool\.poetry\][ \t]*(?:#[^\r\n]*)?\r?$(?:(?!^\[).)*?^version\s*=\s*)(?:\"[^\"]*\"|'[^']*')",
+    re.MULTILINE | re.DOTALL,
+)
+_TAG_CACHE_DIR = os.path.join(
+    os.environ.get("XDG_CACHE_HOME", os.path.expanduser("~/.cache")), "versioning"
+)
 
 
 class BumpType(str, Enum):
@@ -19,20 +38,77 @@ class BumpType(str, Enum):
     PATCH = "patch"
 
 
-def get_most_recent_tag():
-    tag = subprocess.check_output(["git", "describe", "--tags"]).decode("utf-8").strip()
+def _git_state_key() -> Optional[list]:
+    """Get a key that changes whenever the output of git describe can change."""
+    # Reftable repos keep every ref update inside .git/reftable, don't try to track it
+    if not os.path.isdir(".git") or os.path.exists(".git/reftable"):
+        return None
+    with open(".git/HEAD") as f:
+        head = f.read().strip()
+    paths = [".git/HEAD", ".git/packed-refs"]
+    # Tags in nested namespaces only touch their own subdirectory
+    paths.extend(sorted(dirpath for dirpath, _, _ in os.walk(".git/refs/tags")))
+    if head.startswith("ref: "):
+        paths.append(os.path.join(".git", head[len("ref: ") :]))
+    key: list = [os.getcwd(), head]
+    for path in paths:
+        try:
+            key.append(os.stat(path).st_mtime_ns)
+        except FileNotFoundError:
+            key.append(None)
+    return key
+
+
+def _describe_tag() -> "Version":
+    """Run git describe, reusing the result from disk if the repo is unchanged."""
+    try:
+        key = _git_state_key()
+    except OSError:
+        key = None
+    if key is not None:
+        cache_file = os.path.join(
+            _TAG_CACHE_DIR, hashlib.sha1(key[0].encode()).hexdigest() + ".json"
+        )
+        try:
+            with open(cache_file) as f:
+                cached = json.load(f)
+            if cached["key"] == key:
+                return Version.parse(cached["tag"])
+        except (OSError, ValueError, KeyError, TypeError, AttributeError):
+            pass
+    tag = subprocess.run(
+        ["git", "describe", "--tags"], stdout=subprocess.PIPE, text=True, check=True
+    ).stdout.strip()
     version = Version.parse(tag)
+    if key is not None:
+        try:
+            os.makedirs(_TAG_CACHE_DIR, exist_ok=True)
+            # Write then rename so concurrent jobs never see a partial file
+            with tempfile.NamedTemporaryFile(
+                "w", dir=_TAG_CACHE_DIR, suffix=".tmp", delete=False
+            ) as f:
+                json.dump({"key": key, "tag": tag}, f)
+            os.replace(f.name, cache_file)
+        except OSError:
+            pass
+    return version
+
+
+@functools.lru_cache(maxsize=1)
+def get_most_recent_tag():
+    version = _describe_tag()
     if version.prerelease:
-        version.prerelease = f"post.{version.prerelease}"
+        version = dataclasses.replace(version, prerelease=f"post.{version.prerelease}")
     return version
 
 
-class Version(BaseModel):
+@dataclasses.dataclass(frozen=True)
+class Version:
     major: int
     minor: int
     patch: int
-    prerelease: Optional[str] = ""
-    metadata: Optional[str] = ""
+    prerelease: str = ""
+    metadata: str = ""
 
     @classmethod
     def parse(cls, version_str) -> "Version":
@@ -41,20 +117,19 @@ class Version(BaseModel):
             raise ValueError(
                 f"Version starts with 'v' please remove it before proceeding: {version_str}"
             )
-        match = re.match(version_regex, version_str)
+        match = _VERSION_RE.fullmatch(version_str)
         if not match:
             raise ValueError(f"Unknown version string: {version_str}")
         major, minor, patch, prerelease, metadata = match.groups()
-        return cls(
-            major=major,
-            minor=minor,
-            patch=patch,
-            prerelease=prerelease,
-            metadata=metadata,
-        )
+        return cls(int(major), int(minor), int(patch), prerelease or "", metadata or "")
 
     def __str__(self) -> str:
         """Get string representation of the version object."""
+        return self._rendered
+
+    @functools.cached_property
+    def _rendered(self) -> str:
+        # Safe to cache as the dataclass is frozen
         output = f"{self.major}.{self.minor}.{self.patch}"
         if self.prerelease:
             output += f"-{self.prerelease}"
@@ -62,33 +137,64 @@ class Version(BaseModel):
             output += f"+{self.metadata}"
         return output
 
+    @functools.cached_property
+    def _sort_key(self) -> tuple:
+        # SemVer precedence: a release ranks above its prereleases, numeric
+        # identifiers compare as ints below alphanumeric ones, metadata is ignored
+        if not self.prerelease:
+            return (self.major, self.minor, self.patch, (1,))
+        identifiers = tuple(
+            (0, int(part), "") if part.isdigit() else (1, 0, part)
+            for part in self.prerelease.split(".")
+        )
+        return (self.major, self.minor, self.patch, (0, identifiers))
+
     def __lt__(self, other) -> bool:
         if not isinstance(other, Version):
             raise TypeError(f"Can't compare type {type(other)} to type Version.")
-        return str(self) < str(other)
+        return self._sort_key < other._sort_key
 
     def bump(
         self, bump_type: BumpType = BumpType.PATCH, clear_extras: bool = False
     ) -> "Version":
         """Bump the version of the Version object."""
-        out = self.copy()
-        if bump_type == BumpType.MAJOR:
-            out.major += 1
-        elif bump_type == BumpType.MINOR:
-            out.minor += 1
-        elif bump_type == BumpType.PATCH:
-            out.patch += 1
+        # Raises ValueError for unknown types, also accepts the plain str values
+        bump_type = BumpType(bump_type)
+        major, minor, patch = self.major, self.minor, self.patch
+        if bump_type is BumpType.MAJOR:
+            major += 1
+        elif bump_type is BumpType.MINOR:
+            minor += 1
         else:
-            raise ValueError(f"unknown bump_type {bump_type}")
+            patch += 1
         if clear_extras:
-            out.metadata = ""
-            out.prerelease = ""
-        return out
+            return Version(major, minor, patch)
+        return Version(major, minor, patch, self.prerelease, self.metadata)
+
+
+@functools.lru_cache(maxsize=1)
+def _read_pyproject() -> str:
+    """Read pyproject.toml once so the version read and write share it."""
+    # newline="" keeps the file's own line endings for the rewrite
+    with open("pyproject.toml", newline="") as f:
+        return f.read()
+
+
+def _load_toml(contents: str) -> dict:
+    """Parse TOML, importing the parser only when it is needed."""
+    try:
+        import tomllib
+    except ImportError:  # Python < 3.11
+        import toml as tomllib
+
+    return tomllib.loads(contents)
 
 
+@functools.lru_cache(maxsize=1)
 def get_current_version():
     "Get current version of project."
-    poetry_version = toml.load("pyproject.toml")["tool"]["poetry"]["version"]
+    pyproject = _load_toml(_read_pyproject())
+    poetry_version = pyproject["tool"]["poetry"]["version"]
     if poetry_version != py_version:
         raise ValueError(
             f"Python and Poetry version do not match please correct this manually\n"
@@ -98,143 +204,171 @@ def get_current_version():
     return Version.parse(py_version)
 
 
-def write_new_version(
-    version: Version,
-    init_file: str,
-    version_pattern: str = r"^__version__\s*=\s*\"(.*)\"",
-) -> None:
+def write_new_version(version: Version, init_file: str) -> None:
     """Write the new version to the set files."""
-    version_pattern = r"^__version__\s*=\s*\"(.*)\""
-    with open(init_file) as f:
-        contents = f.read()
-        new_contents = re.sub(
-            version_pattern, f'__version__ = "{version}"', contents, flags=re.MULTILINE
-        )
-    with open(init_file, "w") as f:
-        f.write(new_contents)
+    # Only rewrite the [tool.poetry] version line to keep the rest of the file intact,
+    # checked before writing anything so the two files can't end up out of sync
+    new_contents, count = _POETRY_VERSION_RE.subn(
+        rf'\g<1>"{version}"', _read_pyproject(), count=1
+    )
+    if not count:
+        raise ValueError("Could not find [tool.poetry] version in pyproject.toml")
 
-    old_toml = toml.load("pyproject.toml")
-    old_toml["tool"]["poetry"]["version"] = str(version)
-    with open("pyproject.toml", "w") as f:
-        f.write(toml.dumps(old_toml))
+    # newline="" keeps the file's own line endings
+    with open(init_file, "r+", newline="") as f:
+        lines = f.readlines()
+        for i, line in enumerate(lines):
+            name, eq, value = line.partition("=")
+            if eq and name.rstrip() == "__version__" and value.lstrip()[:1] == '"':
+                ending = line[len(line.rstrip("\r\n")) :]
+                lines[i] = f'__version__ = "{version}"{ending}'
+                break
+        f.seek(0)
+        f.writelines(lines)
+        f.truncate()
+
+    with open("pyproject.toml", "w", newline="") as f:
+        f.write(new_contents)
+    _read_pyproject.cache_clear()
+    get_current_version.cache_clear()
 
 
 def validate(tagged_version: Version, current_version: Version):
-    if tagged_version.prerelease is not None and current_version != tagged_version:
+    if tagged_version.prerelease and current_version != tagged_version:
         return False
     return True
 
 
-@app.command("validate")
-def run_validate():
-    tagged_version = get_most_recent_tag()
-    curr_version = get_current_version()
-    if not validate(tagged_version, curr_version):
-        secho(
-            "Detected tag on this version but tagged version and current version do not match.\n"
-            f"Tagged Version: {tagged_version}\n"
-            f"Current Version: {curr_version}"
-        )
-        raise Exit(2)
-    return 0
+def _build_app():
+    """Build the Typer CLI, kept out of module scope so typer is only imported here."""
+    from typer import Exit, Option, Typer, secho
 
+    app = Typer()
 
-@app.command("tag")
-def tag(force: bool = Option(False, "--force")):
-    tagged_version = get_most_recent_tag()
-    current_version = get_current_version()
-    if validate(tagged_version, current_version):
-        secho("Tag already matches current version")
+    @app.command("validate")
+    def run_validate():
+        tagged_version = get_most_recent_tag()
+        curr_version = get_current_version()
+        if not validate(tagged_version, curr_version):
+            secho(
+                "Detected tag on this version but tagged version and current version do not match.\n"
+                f"Tagged Version: {tagged_version}\n"
+                f"Current Version: {curr_version}"
+            )
+            raise Exit(2)
         return 0
-    if current_version.prerelease or current_version.metadata:
-        secho("Can't tag prereleases or metadata yet without --force")
-        raise Exit(2)
-    tag_output = (
-        subprocess.check_output(["git", "tag", str(current_version)])
-        .decode("utf-8")
-        .strip()
-    )
-    if tag_output:
-        print(tag_output)
-    else:
-        secho("success!")
-    return 0
-
-
-@app.command("set")
-def set_version(
-    new_version: str = Option(None, "--version"),
-    bump_type: BumpType = Option(None, "--bump"),
-    prerelease: Optional[str] = Option(None, "--prerelease", "-p"),
-    metadata: Optional[str] = Option(None, "--metadata", "-m"),
-    overwrite: bool = Option(
-        False,
-        "--overwrite",
-        "-o",
-        help="Overwrite the values in pyproject.toml and __init__.py",
-    ),
-    force: bool = Option(
-        False,
-        "--force",
-        "-f",
-        help="Clear the current metadata and prerelease information.",
-    ),
-    clear: bool = Option(
-        False,
-        "--clear",
-        "-c",
-        help="Clear the current metadata and prerelease information.",
-    ),
-    short: bool = Option(
-        False,
-        "--short",
-        "-s",
-        help=" -s.",
-    ),
-):
-    # If version is explicitly passed in override current version
-    curr_version = get_current_version()
-    if new_version:
-        if new_version == "git":
-            version = get_most_recent_tag()
+
+    @app.command("tag")
+    def tag(force: bool = Option(False, "--force")):
+        tagged_version = get_most_recent_tag()
+        current_version = get_current_version()
+        if validate(tagged_version, current_version):
+            secho("Tag already matches current version")
+            return 0
+        if current_version.prerelease or current_version.metadata:
+            secho("Can't tag prereleases or metadata yet without --force")
+            raise Exit(2)
+        tag_output = subprocess.run(
+            ["git", "tag", str(current_version)],
+            stdout=subprocess.PIPE,
+            text=True,
+            check=True,
+        ).stdout.strip()
+        if tag_output:
+            print(tag_output)
         else:
-            version = Version.parse(new_version)
-            if version < curr_version and not force:
+            secho("success!")
+        return 0
+
+    @app.command("set")
+    def set_version(
+        new_version: str = Option(None, "--version"),
+        bump_type: BumpType = Option(None, "--bump"),
+        prerelease: Optional[str] = Option(None, "--prerelease", "-p"),
+        metadata: Optional[str] = Option(None, "--metadata", "-m"),
+        overwrite: bool = Option(
+            False,
+            "--overwrite",
+            "-o",
+            help="Overwrite the values in pyproject.toml and __init__.py",
+        ),
+        force: bool = Option(
+            False,
+            "--force",
+            "-f",
+            help="Clear the current metadata and prerelease information.",
+        ),
+        clear: bool = Option(
+            False,
+            "--clear",
+            "-c",
+            help="Clear the current metadata and prerelease information.",
+        ),
+        short: bool = Option(
+            False,
+            "--short",
+            "-s",
+            help=" -s.",
+        ),
+    ):
+        # If version is explicitly passed in override current version
+        curr_version = get_current_version()
+        if new_version:
+            if new_version == "git":
+                version = get_most_recent_tag()
+            else:
+                version = Version.parse(new_version)
+                if version < curr_version and not force:
+                    secho(
+                        "Version you are setting is less than current version. Please use --force flag to force this change."
+                    )
+                    raise Exit(2)
+        else:
+            version = curr_version
+        # Bump the version with the corresponding CLI arg
+        if bump_type:
+            version = version.bump(bump_type=bump_type, clear_extras=clear)
+        # If we are adding prerelease/metadata information make sure we are not overwriting unless explictly set
+        if prerelease is not None or metadata is not None:
+            if not (version.prerelease or version.metadata) or force:
+                version = dataclasses.replace(
+                    version, prerelease=prerelease or "", metadata=metadata or ""
+                )
+            else:
                 secho(
-                    "Version you are setting is less than current version. Please use --force flag to force this change."
+                    "Current version has metadata or prerelease information that you are trying to replace, please use the --force to force"
                 )
                 raise Exit(2)
-    else:
-        version = curr_version
-    # Bump the version with the corresponding CLI arg
-    if bump_type:
-        version = version.bump(bump_type=bump_type, clear_extras=clear)
-    # If we are adding prerelease/metadata information make sure we are not overwriting unless explictly set
-    if prerelease is not None or metadata is not None:
-        if (version.prerelease is None and version.metadata is None) or force:
-            version.prerelease = prerelease
-            version.metadata = metadata
+        if overwrite:
+            write_new_version(version, utilities.__file__)
+        if short:
+            secho(version)
         else:
-            secho(
-                "Current version has metadata or prerelease information that you are trying to replace, please use the --force to force"
-            )
-            raise Exit(2)
-    if overwrite:
-        write_new_version(version, utilities.__file__)
-    if short:
-        secho(version)
-    else:
-        secho(f"New version: {version}")
-    return 0
-
-
-@app.command("get")
-def get_version():
-    # If version is explicitly passed in override current version
-    curr_version = get_current_version()
+            secho(f"New version: {version}")
+        return 0
+
+    @app.command("get")
+    def get_version():
+        # If version is explicitly passed in override current version
+        curr_version = get_current_version()
+        print(curr_version)
+        return 0
+
+    return app
+
+
+def _fast_get() -> bool:
+    """Print the version for a bare `get` without importing typer."""
+    try:
+        curr_version = get_current_version()
+    except (OSError, KeyError, ValueError):
+        # Let the full CLI report the problem
+        return False
     print(curr_version)
-    return 0
+    return True
 
 
 if __name__ == "__main__":
-    app()
+    if sys.argv[1:] == ["get"] and _fast_get():
+        sys.exit(0)
+    _build_app()()
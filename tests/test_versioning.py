@@ -0,0 +1,187 @@
+"""Tests for scripts/versioning.py"""
+
+import importlib.util
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+_path = Path(__file__).parents[1] / "scripts" / "versioning.py"
+_spec = importlib.util.spec_from_file_location("versioning", _path)
+versioning = importlib.util.module_from_spec(_spec)
+sys.modules["versioning"] = versioning
+_spec.loader.exec_module(versioning)
+Version = versioning.Version
+
+
+@pytest.mark.parametrize(
+    "lower,higher",
+    [
+        ("2.0.0", "10.0.0"),
+        ("1.9.0", "1.10.0"),
+        ("1.0.0-rc.1", "1.0.0"),
+        ("1.0.0-rc.9", "1.0.0-rc.10"),
+        ("1.0.0-1", "1.0.0-alpha"),
+        ("1.0.0-alpha", "1.0.0-alpha.1"),
+    ],
+)
+def test_version_ordering(lower, higher):
+    assert Version.parse(lower) < Version.parse(higher)
+    assert not Version.parse(higher) < Version.parse(lower)
+
+
+def test_version_ordering_ignores_metadata():
+    assert not Version.parse("1.0.0+b") < Version.parse("1.0.0+a")
+    assert not Version.parse("1.0.0+a") < Version.parse("1.0.0+b")
+
+
+def test_parse_git_describe():
+    version = Version.parse("0.0.2-3-gabc123")
+    assert (version.prerelease, version.metadata) == ("3", "gabc123")
+    assert str(version) == "0.0.2-3+gabc123"
+
+
+@pytest.mark.parametrize("bump_type", [versioning.BumpType.MAJOR, "major"])
+def test_bump(bump_type):
+    assert str(Version.parse("1.2.3-rc.1").bump(bump_type)) == "2.2.3-rc.1"
+    assert str(Version.parse("1.2.3-rc.1").bump(bump_type, clear_extras=True)) == (
+        "2.2.3"
+    )
+
+
+@pytest.fixture
+def project(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    versioning._read_pyproject.cache_clear()
+    init_file = tmp_path / "__init__.py"
+    init_file.write_text('"""Package"""\n__version__ = "0.0.2"\n')
+    yield tmp_path, init_file
+    versioning._read_pyproject.cache_clear()
+
+
+def test_write_new_version(project):
+    tmp_path, init_file = project
+    (tmp_path / "pyproject.toml").write_text(
+        '[project]\nversion = "9.9.9"\n\n'
+        "[tool.poetry]\n# keep me\nname = 'pkg'\nversion = '0.0.2'\n\n"
+        '[tool.other]\nversion = "1.1.1"\n'
+    )
+    versioning.write_new_version(Version.parse("0.0.3"), str(init_file))
+    assert (tmp_path / "pyproject.toml").read_text() == (
+        '[project]\nversion = "9.9.9"\n\n'
+        "[tool.poetry]\n# keep me\nname = 'pkg'\nversion = \"0.0.3\"\n\n"
+        '[tool.other]\nversion = "1.1.1"\n'
+    )
+    assert init_file.read_text() == '"""Package"""\n__version__ = "0.0.3"\n'
+
+
+@pytest.mark.parametrize(
+    "contents,expected",
+    [
+        (
+            '[tool.poetry]  # main\nversion = "0.0.2"\n',
+            '[tool.poetry]  # main\nversion = "0.0.3"\n',
+        ),
+        (
+            '[tool.poetry]\r\nname = "pkg"\r\nversion = "0.0.2"\r\n',
+            '[tool.poetry]\r\nname = "pkg"\r\nversion = "0.0.3"\r\n',
+        ),
+    ],
+)
+def test_write_new_version_keeps_formatting(project, contents, expected):
+    tmp_path, init_file = project
+    (tmp_path / "pyproject.toml").write_bytes(contents.encode())
+    versioning.write_new_version(Version.parse("0.0.3"), str(init_file))
+    assert (tmp_path / "pyproject.toml").read_bytes() == expected.encode()
+
+
+def test_write_new_version_missing_key(project):
+    tmp_path, init_file = project
+    (tmp_path / "pyproject.toml").write_text(
+        '[tool.poetry]\nname = "pkg"\n\n[tool.other]\nversion = "0.0.2"\n'
+    )
+    with pytest.raises(ValueError):
+        versioning.write_new_version(Version.parse("0.0.3"), str(init_file))
+    assert init_file.read_text() == '"""Package"""\n__version__ = "0.0.2"\n'
+
+
+def _git(repo, *args):
+    subprocess.run(
+        ["git", "-c", "user.name=test", "-c", "user.email=test@example.com", *args],
+        cwd=repo,
+        check=True,
+        stdout=subprocess.DEVNULL,
+    )
+
+
+@pytest.fixture
+def git_repo(tmp_path, monkeypatch):
+    repo = tmp_path / "repo"
+    repo.mkdir()
+    _git(repo, "init", "-q")
+    (repo / "file.txt").write_text("a\n")
+    _git(repo, "add", "file.txt")
+    _git(repo, "commit", "-q", "-m", "first")
+    _git(repo, "tag", "0.0.1")
+    monkeypatch.chdir(repo)
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path / "cache"))
+    monkeypatch.setattr(versioning, "_TAG_CACHE_DIR", str(tmp_path / "cache"))
+
+    describe_calls = []
+    run = subprocess.run
+
+    def counting_run(args, *rest, **kwargs):
+        if args[:2] == ["git", "describe"]:
+            describe_calls.append(args)
+        return run(args, *rest, **kwargs)
+
+    monkeypatch.setattr(versioning.subprocess, "run", counting_run)
+    yield repo, describe_calls
+
+
+def test_describe_tag_cached(git_repo):
+    _, describe_calls = git_repo
+    assert str(versioning._describe_tag()) == "0.0.1"
+    assert str(versioning._describe_tag()) == "0.0.1"
+    assert len(describe_calls) == 1
+
+
+def test_describe_tag_new_commit(git_repo):
+    repo, describe_calls = git_repo
+    versioning._describe_tag()
+    (repo / "file.txt").write_text("b\n")
+    _git(repo, "commit", "-q", "-am", "second")
+    version = versioning._describe_tag()
+    assert (version.patch, version.prerelease) == (1, "1")
+    assert len(describe_calls) == 2
+
+
+def test_describe_tag_new_tag(git_repo):
+    repo, describe_calls = git_repo
+    versioning._describe_tag()
+    (repo / "file.txt").write_text("b\n")
+    _git(repo, "commit", "-q", "-am", "second")
+    versioning._describe_tag()
+    _git(repo, "tag", "0.0.2")
+    assert str(versioning._describe_tag()) == "0.0.2"
+    assert len(describe_calls) == 3
+
+
+def test_describe_tag_corrupt_cache(git_repo, tmp_path):
+    _, describe_calls = git_repo
+    versioning._describe_tag()
+    (cache_file,) = (tmp_path / "cache").glob("*.json")
+    cache_file.write_text('{"key": [')
+    assert str(versioning._describe_tag()) == "0.0.1"
+    assert len(describe_calls) == 2
+
+
+def test_describe_tag_without_git_dir(git_repo, monkeypatch, tmp_path):
+    repo, describe_calls = git_repo
+    (repo / "sub").mkdir()
+    monkeypatch.chdir(repo / "sub")
+    versioning._describe_tag()
+    versioning._describe_tag()
+    assert len(describe_calls) == 2
+    assert not (tmp_path / "cache").exists()